@@ -1,32 +1,35 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy import select
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.deps import get_db
 from app.db.models import Item
 from app.schemas.item import ItemCreate, ItemRead
 from app.schemas.order import OrderCreate, ProcessedOrderRead
-from app.services.order_processor import OrderProcessor
+from app.services.order_processor import OrderProcessor, UnknownCursorError
 
 router = APIRouter()
 
 
 @router.post("/items", response_model=ItemRead, tags=["items"])
 async def create_item(payload: ItemCreate, db: AsyncSession = Depends(get_db)):
-    item = Item(name=payload.name, description=payload.description or "")
-    db.add(item)
+    res = await db.execute(
+        insert(Item)
+        .values(name=payload.name, description=payload.description or "")
+        .returning(Item.id, Item.name, Item.description)
+    )
+    row = res.mappings().one()
     await db.commit()
-    await db.refresh(item)
-    return ItemRead.model_validate(item.__dict__)
+    return ItemRead.model_construct(**row)
 
 
 @router.get("/items", response_model=list[ItemRead], tags=["items"])
 async def list_items(db: AsyncSession = Depends(get_db)):
-    res = await db.execute(select(Item))
-    rows = res.scalars().all()
-    return [ItemRead.model_validate(i.__dict__) for i in rows]
+    res = await db.execute(select(Item.id, Item.name, Item.description))
+    rows = res.mappings().all()
+    return [ItemRead.model_construct(**row) for row in rows]
 
 
 def _get_processor(request: Request) -> OrderProcessor:
@@ -44,9 +47,12 @@ async def enqueue_order(payload: OrderCreate, request: Request):
 
 
 @router.get("/orders", response_model=list[ProcessedOrderRead], tags=["orders"])
-async def list_orders(request: Request, limit: int = 50):
+async def list_orders(request: Request, limit: int = 50, before: int | None = None):
     processor = _get_processor(request)
-    return await processor.list_processed(limit=limit)
+    try:
+        return await processor.list_processed(limit=limit, before=before)
+    except UnknownCursorError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
 
 
 @router.get(
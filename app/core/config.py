@@ -4,9 +4,14 @@ from pydantic import Field
 class Settings(BaseSettings):
     API_PREFIX: str = "/api/v1"
     DB_URL: str = Field(default="sqlite+aiosqlite:///./app.db")
+    DB_POOL_SIZE: int | None = Field(default=None, ge=1)
+    DB_MAX_OVERFLOW: int = Field(default=20, ge=0)
+    DB_POOL_RECYCLE: int = Field(default=1800)
+    DB_POOL_PRE_PING: bool = True
     CORS_ORIGINS: list[str] = ["*"]
     ORDER_REDIS_URL: str | None = Field(default=None, alias="ORDER_QUEUE_REDIS_URL")
     ORDER_REDIS_QUEUE: str = Field(default="orderflow:orders")
+    ORDER_CONCURRENCY: int = Field(default=4, ge=1)
 
     class Config:
         env_file = ".env"
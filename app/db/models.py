@@ -2,10 +2,11 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, JSON, String, func
+from sqlalchemy import DateTime, Float, Index, String, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.base import Base
+from app.db.types import ORJSON
 
 class Item(Base):
     __tablename__ = "items"
@@ -16,6 +17,9 @@ class Item(Base):
 
 class ProcessedOrder(Base):
     __tablename__ = "processed_orders"
+    __table_args__ = (
+        Index("ix_processed_orders_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     order_id: Mapped[int] = mapped_column(unique=True, index=True)
@@ -25,8 +29,8 @@ class ProcessedOrder(Base):
     discount: Mapped[float] = mapped_column(Float)
     final_total: Mapped[float] = mapped_column(Float)
     hash_id: Mapped[str] = mapped_column(String(64), unique=True, index=True)
-    items: Mapped[dict] = mapped_column(JSON)
-    extra: Mapped[dict | None] = mapped_column(JSON, default=None)
+    items: Mapped[dict] = mapped_column(ORJSON)
+    extra: Mapped[dict | None] = mapped_column(ORJSON, default=None)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
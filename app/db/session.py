@@ -1,7 +1,36 @@
+from typing import Any
+
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
 
-engine = create_async_engine(settings.DB_URL, echo=False, future=True)
+
+def _engine_options(db_url: str) -> dict[str, Any]:
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory databases live in a single connection; keep SQLAlchemy's default pool.
+        return {}
+
+    options: dict[str, Any] = {
+        "pool_size": settings.DB_POOL_SIZE or max(10, settings.ORDER_CONCURRENCY * 2),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if url.get_backend_name() == "sqlite":
+        # aiosqlite defaults to NullPool, which opens a connection (and thread) per session.
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+engine = create_async_engine(
+    settings.DB_URL,
+    echo=False,
+    future=True,
+    query_cache_size=1200,
+    **_engine_options(settings.DB_URL),
+)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 # Create tables when using SQLite (optional, handy in development)
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from typing import Any
+
+import orjson
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+
+class ORJSON(TypeDecorator[Any]):
+    """JSON document encoded with orjson and stored as text.
+
+    Replaces SQLAlchemy's ``JSON`` type, which round-trips values through the
+    stdlib ``json`` module. Text storage keeps existing JSON columns readable.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect: Any) -> str | None:
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            return value.decode()
+        return orjson.dumps(value).decode()
+
+    def process_result_value(self, value: Any, dialect: Any) -> Any:
+        if value is None:
+            return None
+        return orjson.loads(value)
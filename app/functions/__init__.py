@@ -3,14 +3,13 @@ Dynamic registry and auto-discovery of transformation functions.
 
 Any module inside this package can register functions using the decorator
 provided by :mod:`app.functions.registry`. When this package is imported we
-scan sibling modules and import them, triggering registrations automatically.
+import the modules listed in ``__all_modules__``, triggering registrations.
+New function modules must be added to that tuple.
 """
 
 from __future__ import annotations
 
 import importlib
-import pkgutil
-from pathlib import Path
 
 from .registry import (
     call_function,
@@ -27,13 +26,15 @@ __all__ = [
 ]
 
 
+__all_modules__ = (
+    "arithmetic",
+    "text",
+)
+
+
 def _auto_discover() -> None:
-    """Import every peer module to trigger registration side-effects."""
-    package_path = Path(__file__).resolve().parent
-    for module_info in pkgutil.iter_modules([str(package_path)]):
-        module_name = module_info.name
-        if module_name.startswith("_") or module_name == "registry":
-            continue
+    """Import every listed module to trigger registration side-effects."""
+    for module_name in __all_modules__:
         importlib.import_module(f"{__name__}.{module_name}")
 
 
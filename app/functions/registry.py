@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import sys
 from collections.abc import Callable
 from typing import Any, Dict
 
@@ -20,7 +21,7 @@ def register(name: str | None = None) -> Callable[[Callable[..., Any]], Callable
     """
 
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
-        key = (name or func.__name__).lower()
+        key = sys.intern((name or func.__name__).lower())
         if key in _registry:
             raise ValueError(f"Function '{key}' already registered.")
         _registry[key] = func
@@ -30,6 +31,10 @@ def register(name: str | None = None) -> Callable[[Callable[..., Any]], Callable
 
 
 def get_function(name: str) -> Callable[..., Any]:
+    # Keys are stored lowercase; most callers already pass them that way.
+    func = _registry.get(name)
+    if func is not None:
+        return func
     try:
         return _registry[name.lower()]
     except KeyError as exc:
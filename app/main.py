@@ -9,7 +9,9 @@ from app.api.v1.routes import router as api_router
 from app.core.config import settings
 from app.db.session import async_session, init_models
 from app.services.order_processor import OrderProcessor
+from app.services.product_provider import FakeStoreProductProvider
 from app.services.redis_consumer import RedisOrderConsumer
+from app.utils.http_client import DEFAULT_MAX_KEEPALIVE
 
 try:
     from redis.asyncio import Redis
@@ -22,7 +24,16 @@ logger = logging.getLogger("orderflow.app")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_models()
-    processor = OrderProcessor(async_session)
+    # Every order worker may be fetching products at once; keep a warm connection for each.
+    product_provider = FakeStoreProductProvider(
+        max_keepalive=max(DEFAULT_MAX_KEEPALIVE, settings.ORDER_CONCURRENCY)
+    )
+    await product_provider.start()
+    processor = OrderProcessor(
+        async_session,
+        product_provider=product_provider,
+        concurrency=settings.ORDER_CONCURRENCY,
+    )
     await processor.start()
     app.state.order_processor = processor
 
@@ -53,6 +64,7 @@ async def lifespan(app: FastAPI):
             await redis_consumer.stop()
             await redis_consumer.close()
         await processor.stop()
+        await product_provider.close()
 
 
 app = FastAPI(title="MyApp API", version="0.1.0", lifespan=lifespan)
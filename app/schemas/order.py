@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import re
 from datetime import datetime
 from typing import Any
 
 from pydantic import BaseModel, Field, field_validator, model_validator
 
+_SKU_PRODUCT_ID = re.compile(r"(\d+)$")
+
 
 class OrderProduct(BaseModel):
     sku: str = Field(min_length=1, max_length=50)
@@ -16,6 +19,17 @@ class OrderProduct(BaseModel):
     def _price_precision(cls, value: float) -> float:
         return round(float(value), 2)
 
+    @property
+    def product_id(self) -> int | None:
+        """The trailing digits of ``sku``; None when the SKU has none."""
+        match = _SKU_PRODUCT_ID.search(self.sku)
+        return int(match.group(1)) if match else None
+
+    @property
+    def unit_price_cents(self) -> int:
+        """``unit_price`` in integer cents, so totals are computed without float rounding."""
+        return round(self.unit_price * 100)
+
 
 class OrderCreate(BaseModel):
     id: int = Field(gt=0)
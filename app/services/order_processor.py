@@ -2,13 +2,15 @@ from __future__ import annotations
 
 import asyncio
 import hashlib
-import json
 import logging
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Callable
+from typing import Any, Callable, Mapping, Sequence
 
-from sqlalchemy import select
+import orjson
+from sqlalchemy import Integer, and_, bindparam, or_, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.db.models import ProcessedOrder
@@ -17,15 +19,197 @@ from app.services.product_provider import (
     FakeStoreProductProvider,
     ProductLookupError,
     ProductProvider,
+    ProductServiceUnavailable,
 )
 
 logger = logging.getLogger("orderflow.order_processor")
 
+# Shortest wait before requeueing an order whose provider's breaker is open.
+_MIN_UNAVAILABLE_DELAY = 0.05
+
+# Result pages with at least this many items are converted in a worker thread.
+_OFFLOAD_MIN_ITEMS = 100
+
+_READ_COLUMNS = (
+    ProcessedOrder.order_id,
+    ProcessedOrder.customer,
+    ProcessedOrder.submitted_at,
+    ProcessedOrder.total,
+    ProcessedOrder.discount,
+    ProcessedOrder.final_total,
+    ProcessedOrder.hash_id,
+    ProcessedOrder.items,
+    ProcessedOrder.extra,
+    ProcessedOrder.created_at,
+)
+
+_UPSERT_COLUMNS = (
+    "customer",
+    "submitted_at",
+    "total",
+    "discount",
+    "final_total",
+    "hash_id",
+    "items",
+    "extra",
+)
+
+
+def _build_upsert(insert: Callable[..., Any]) -> Any:
+    stmt = insert(ProcessedOrder)
+    return stmt.on_conflict_do_update(
+        index_elements=[ProcessedOrder.order_id],
+        set_={column: stmt.excluded[column] for column in _UPSERT_COLUMNS},
+    )
+
+
+# Statements are built once and executed with bound parameters.
+_UPSERT_BY_DIALECT = {
+    "postgresql": _build_upsert(postgresql_insert),
+    "sqlite": _build_upsert(sqlite_insert),
+}
+
+_SELECT_PROCESSED_IDS = select(ProcessedOrder.order_id).where(
+    ProcessedOrder.order_id.in_(bindparam("order_ids", expanding=True))
+)
+
+_SELECT_BY_ORDER_ID = select(*_READ_COLUMNS).where(
+    ProcessedOrder.order_id == bindparam("order_id")
+)
+
+_SELECT_LATEST = (
+    select(*_READ_COLUMNS)
+    .order_by(ProcessedOrder.created_at.desc(), ProcessedOrder.id.desc())
+    .limit(bindparam("limit", type_=Integer))
+)
+
+
+def _build_select_before() -> Any:
+    cursor = ProcessedOrder.order_id == bindparam("before")
+    cursor_created_at = select(ProcessedOrder.created_at).where(cursor).scalar_subquery()
+    cursor_id = select(ProcessedOrder.id).where(cursor).scalar_subquery()
+    return _SELECT_LATEST.where(
+        or_(
+            ProcessedOrder.created_at < cursor_created_at,
+            and_(
+                ProcessedOrder.created_at == cursor_created_at,
+                ProcessedOrder.id < cursor_id,
+            ),
+        )
+    )
+
+
+# Keyset pagination: rows strictly older than the ``before`` order.
+_SELECT_LATEST_BEFORE = _build_select_before()
+
+_SELECT_ORDER_EXISTS = select(ProcessedOrder.id).where(
+    ProcessedOrder.order_id == bindparam("order_id")
+)
+
+
+class UnknownCursorError(LookupError):
+    """Raised when a pagination cursor names an order that was never processed."""
+
+
+def _processed_from_row(row: Mapping[str, Any]) -> ProcessedOrderRead:
+    """Build a response model from a trusted database row without re-validating it."""
+    values = dict(row)
+    values["items"] = [
+        EnrichedProduct.model_construct(**product) for product in (row["items"] or [])
+    ]
+    return ProcessedOrderRead.model_construct(**values)
+
+
+def _processed_from_rows(rows: Sequence[Mapping[str, Any]]) -> list[ProcessedOrderRead]:
+    return [_processed_from_row(row) for row in rows]
+
 
 @dataclass(slots=True)
 class QueueJob:
     payload: OrderCreate
     attempt: int = 0
+    deferrals: int = 0
+
+
+class _DedupBatcher:
+    """Coalesce "already processed" lookups into a single ``IN (...)`` query.
+
+    Callers await :meth:`check`; pending ids are flushed once ``max_batch`` of
+    them accumulate or ``max_delay`` seconds pass, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        *,
+        max_batch: int = 100,
+        max_delay: float = 0.005,
+    ) -> None:
+        self._session_factory = session_factory
+        self._max_batch = max(1, max_batch)
+        self._max_delay = max(0.0, max_delay)
+        self._pending: dict[int, list[asyncio.Future[bool]]] = {}
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    async def check(self, order_id: int) -> bool:
+        future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(order_id, []).append(future)
+        self._has_pending.set()
+        if len(self._pending) >= self._max_batch:
+            self._batch_full.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="order-dedup-batcher")
+        return await future
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        for futures in self._pending.values():
+            for future in futures:
+                future.cancel()
+        self._pending.clear()
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            if len(self._pending) < self._max_batch:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self._max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._has_pending.clear()
+            self._batch_full.clear()
+            batch, self._pending = self._pending, {}
+
+            try:
+                processed = await self._fetch_processed(list(batch))
+            except asyncio.CancelledError:
+                # close() during a query: the batch is no longer in _pending.
+                for futures in batch.values():
+                    for future in futures:
+                        future.cancel()
+                raise
+            except Exception as exc:  # noqa: BLE001
+                for futures in batch.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(exc)
+                continue
+
+            for order_id, futures in batch.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(order_id in processed)
+
+    async def _fetch_processed(self, order_ids: list[int]) -> set[int]:
+        async with self._session_factory() as session:
+            result = await session.scalars(_SELECT_PROCESSED_IDS, {"order_ids": order_ids})
+            return set(result.all())
 
 
 class OrderProcessor:
@@ -36,17 +220,22 @@ class OrderProcessor:
         product_provider: ProductProvider | None = None,
         concurrency: int = 4,
         max_retries: int = 3,
+        max_deferrals: int = 5,
         hash_factory: Callable[[OrderCreate, float], str] | None = None,
     ) -> None:
         self._session_factory = session_factory
         self._product_provider = product_provider or FakeStoreProductProvider()
         self._concurrency = max(1, concurrency)
         self._max_retries = max(0, max_retries)
+        self._max_deferrals = max(0, max_deferrals)
         self._hash_factory = hash_factory or self._default_hash_factory
 
         self._queue: asyncio.Queue[QueueJob] = asyncio.Queue()
         self._workers: list[asyncio.Task[None]] = []
+        # Jobs waiting out an open provider breaker before they are requeued.
+        self._deferred: set[asyncio.Task[None]] = set()
         self._shutdown_event = asyncio.Event()
+        self._dedup_batcher = _DedupBatcher(session_factory)
 
     async def start(self) -> None:
         if self._workers:
@@ -61,57 +250,92 @@ class OrderProcessor:
 
     async def stop(self) -> None:
         self._shutdown_event.set()
+        for task in self._deferred:
+            task.cancel()
+        await asyncio.gather(*self._deferred, return_exceptions=True)
         await self._queue.join()
         for task in self._workers:
             task.cancel()
         await asyncio.gather(*self._workers, return_exceptions=True)
         self._workers.clear()
+        await self._dedup_batcher.close()
         logger.info("OrderProcessor stopped.")
 
     async def enqueue(self, order: OrderCreate | dict[str, Any]) -> None:
         payload = order if isinstance(order, OrderCreate) else OrderCreate.model_validate(order)
-        if await self._is_already_processed(payload.id):
+        if await self._dedup_batcher.check(payload.id):
             logger.info("Order %s already processed; ignoring new request.", payload.id)
             return
         await self._queue.put(QueueJob(payload=payload))
         logger.info("Order %s queued.", payload.id)
 
     async def wait_for_all(self) -> None:
-        """Wait for the queue to finish processing all pending items."""
-        await self._queue.join()
+        """Wait for the queue, including deferred jobs, to finish processing."""
+        while True:
+            await self._queue.join()
+            if not self._deferred:
+                return
+            await asyncio.wait(set(self._deferred))
 
     async def _worker_loop(self, worker_id: int) -> None:
+        # Workers block on the queue until stop() cancels them, which only
+        # happens once the queue has been drained.
         logger.debug("Worker %s started.", worker_id)
-        while True:
-            if self._shutdown_event.is_set() and self._queue.empty():
-                break
-            try:
-                job = await asyncio.wait_for(self._queue.get(), timeout=0.5)
-            except asyncio.TimeoutError:
-                continue
-
-            try:
-                await self._process_job(job, worker_id)
-            finally:
-                self._queue.task_done()
-        logger.debug("Worker %s finished.", worker_id)
+        try:
+            while True:
+                job = await self._queue.get()
+                try:
+                    await self._process_job(job, worker_id)
+                finally:
+                    self._queue.task_done()
+        finally:
+            logger.debug("Worker %s finished.", worker_id)
 
     async def _process_job(self, job: QueueJob, worker_id: int) -> None:
         order = job.payload
-        if await self._is_already_processed(order.id):
-            logger.info("Order %s was already processed; skipping.", order.id)
-            return
-
         try:
             processed = await self._process_order(order)
             await self._persist_processed(order, processed)
             logger.info("Order %s processed by worker %s.", order.id, worker_id)
+        except ProductServiceUnavailable as exc:
+            await self._defer(job, exc)
         except ProductLookupError as exc:
             await self._handle_failure(job, exc)
         except Exception as exc:  # noqa: BLE001
             logger.exception("Unexpected error processing order %s", order.id)
             await self._handle_failure(job, exc)
 
+    async def _defer(self, job: QueueJob, exc: ProductServiceUnavailable) -> None:
+        """Requeue once the provider's breaker admits calls again.
+
+        The wait happens in a separate task so the worker moves on to other
+        jobs. The first ``max_deferrals`` deferrals do not spend an attempt;
+        after that an open breaker counts as an ordinary failure.
+        """
+        if self._shutdown_event.is_set() or job.deferrals >= self._max_deferrals:
+            await self._handle_failure(job, exc)
+            return
+        job.deferrals += 1
+        delay = max(exc.retry_after, _MIN_UNAVAILABLE_DELAY)
+        logger.warning(
+            "Product service unavailable for order %s; retrying in %.1fs.",
+            job.payload.id,
+            delay,
+        )
+        task = asyncio.create_task(
+            self._requeue_later(job, delay), name=f"order-deferred-{job.payload.id}"
+        )
+        self._deferred.add(task)
+        task.add_done_callback(self._deferred.discard)
+
+    async def _requeue_later(self, job: QueueJob, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            logger.warning("Dropped deferred order %s during shutdown.", job.payload.id)
+            raise
+        await self._queue.put(job)
+
     async def _handle_failure(self, job: QueueJob, exc: Exception) -> None:
         if self._shutdown_event.is_set():
             logger.warning(
@@ -139,20 +363,20 @@ class OrderProcessor:
             )
 
     async def _process_order(self, order: OrderCreate) -> ProcessedOrderRead:
-        product_data = await self._product_provider.get_many(
-            [product.sku for product in order.items]
-        )
+        product_data = await self._product_provider.get_many(order.items)
 
         enriched: list[EnrichedProduct] = []
-        subtotal = 0.0
+        subtotal_cents = 0
 
         for product in order.items:
             api_info = product_data.get(product.sku) or {}
             api_price_raw = api_info.get("price")
             api_price = round(float(api_price_raw), 2) if api_price_raw is not None else None
-            unit_price = api_price if api_price is not None else product.unit_price
-            line_total = round(unit_price * product.quantity, 2)
-            subtotal += line_total
+            unit_price_cents = (
+                round(api_price * 100) if api_price is not None else product.unit_price_cents
+            )
+            line_total_cents = unit_price_cents * product.quantity
+            subtotal_cents += line_total_cents
 
             enriched.append(
                 EnrichedProduct(
@@ -164,16 +388,19 @@ class OrderProcessor:
                     api_price=api_price,
                     category=api_info.get("category"),
                     description=api_info.get("description"),
-                    line_total=line_total,
+                    line_total=line_total_cents / 100,
                 )
             )
 
-        subtotal = round(subtotal, 2)
-        discount = round(subtotal * 0.10, 2) if subtotal > 500 else 0.0
-        final_total = round(subtotal - discount, 2)
+        # 10% off orders above 500, rounded half-up to the cent.
+        discount_cents = (subtotal_cents + 5) // 10 if subtotal_cents > 50_000 else 0
+        subtotal = subtotal_cents / 100
+        discount = discount_cents / 100
+        final_total = (subtotal_cents - discount_cents) / 100
         hash_id = self._hash_factory(order, final_total)
 
-        return ProcessedOrderRead(
+        # Every field below is either validated input or computed here.
+        return ProcessedOrderRead.model_construct(
             order_id=order.id,
             customer=order.customer,
             submitted_at=order.submitted_at,
@@ -192,104 +419,73 @@ class OrderProcessor:
         processed: ProcessedOrderRead,
     ) -> None:
         async with self._session_factory() as session:
-            existing = await session.scalar(
-                select(ProcessedOrder).where(ProcessedOrder.order_id == order.id)
-            )
-            payload_json = [
-                product.model_dump(mode="json") for product in processed.items
-            ]
-            if existing:
-                existing.customer = processed.customer
-                existing.submitted_at = processed.submitted_at
-                existing.total = processed.total
-                existing.discount = processed.discount
-                existing.final_total = processed.final_total
-                existing.hash_id = processed.hash_id
-                existing.items = payload_json
-                existing.extra = processed.extra
-            else:
-                session.add(
-                    ProcessedOrder(
-                        order_id=processed.order_id,
-                        customer=processed.customer,
-                        submitted_at=processed.submitted_at,
-                        total=processed.total,
-                        discount=processed.discount,
-                        final_total=processed.final_total,
-                        hash_id=processed.hash_id,
-                        items=payload_json,
-                        extra=processed.extra,
-                    )
+            stmt = _UPSERT_BY_DIALECT.get(session.bind.dialect.name)
+            if stmt is None:
+                raise RuntimeError(
+                    f"Unsupported database dialect '{session.bind.dialect.name}'."
                 )
-
-            await session.commit()
-
-    async def _is_already_processed(self, order_id: int) -> bool:
-        async with self._session_factory() as session:
-            exists = await session.scalar(
-                select(ProcessedOrder.order_id).where(ProcessedOrder.order_id == order_id)
+            await session.execute(
+                stmt,
+                {
+                    "order_id": processed.order_id,
+                    "customer": processed.customer,
+                    "submitted_at": processed.submitted_at,
+                    "total": processed.total,
+                    "discount": processed.discount,
+                    "final_total": processed.final_total,
+                    "hash_id": processed.hash_id,
+                    "items": [product.__dict__ for product in processed.items],
+                    "extra": processed.extra,
+                },
             )
-            return exists is not None
+            await session.commit()
 
     @staticmethod
     def _default_hash_factory(order: OrderCreate, final_total: float) -> str:
-        payload = json.dumps(
+        payload = orjson.dumps(
             {
                 "order_id": order.id,
                 "customer": order.customer,
-                "submitted_at": order.submitted_at.isoformat(),
+                "submitted_at": order.submitted_at,
                 "final_total": final_total,
             },
-            sort_keys=True,
-        ).encode("utf-8")
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NAIVE_UTC,
+        )
         return hashlib.sha256(payload).hexdigest()
 
-    async def list_processed(self, limit: int = 50) -> list[ProcessedOrderRead]:
+    async def list_processed(
+        self,
+        limit: int = 50,
+        *,
+        before: int | None = None,
+    ) -> list[ProcessedOrderRead]:
+        """Return processed orders, newest first.
+
+        ``before`` is the ``order_id`` of the last order of a previous page;
+        only orders older than it are returned (keyset pagination). An unknown
+        ``before`` raises :class:`UnknownCursorError` instead of an empty page.
+        """
+        if before is None:
+            stmt, params = _SELECT_LATEST, {"limit": limit}
+        else:
+            stmt, params = _SELECT_LATEST_BEFORE, {"limit": limit, "before": before}
         async with self._session_factory() as session:
-            result = await session.execute(
-                select(ProcessedOrder)
-                .order_by(ProcessedOrder.created_at.desc())
-                .limit(limit)
-            )
-            rows = result.scalars().all()
-            return [
-                ProcessedOrderRead(
-                    order_id=row.order_id,
-                    customer=row.customer,
-                    submitted_at=row.submitted_at,
-                    total=row.total,
-                    discount=row.discount,
-                    final_total=row.final_total,
-                    hash_id=row.hash_id,
-                    items=[
-                        EnrichedProduct.model_validate(product)
-                        for product in (row.items or [])
-                    ],
-                    extra=row.extra,
-                    created_at=row.created_at,
-                )
-                for row in rows
-            ]
+            result = await session.execute(stmt, params)
+            rows = result.mappings().all()
+            # The cursor subqueries are NULL for an unknown order; only check on empty pages.
+            if not rows and before is not None:
+                exists = await session.execute(_SELECT_ORDER_EXISTS, {"order_id": before})
+                if exists.first() is None:
+                    raise UnknownCursorError(f"Order {before} not found.")
+        if sum(len(row["items"] or ()) for row in rows) >= _OFFLOAD_MIN_ITEMS:
+            # Large pages would hold the event loop for milliseconds.
+            return await asyncio.to_thread(_processed_from_rows, rows)
+        return _processed_from_rows(rows)
 
     async def get_processed(self, order_id: int) -> ProcessedOrderRead | None:
         async with self._session_factory() as session:
-            row = await session.scalar(
-                select(ProcessedOrder).where(ProcessedOrder.order_id == order_id)
-            )
-            if row is None:
-                return None
-            return ProcessedOrderRead(
-                order_id=row.order_id,
-                customer=row.customer,
-                submitted_at=row.submitted_at,
-                total=row.total,
-                discount=row.discount,
-                final_total=row.final_total,
-                hash_id=row.hash_id,
-                items=[
-                    EnrichedProduct.model_validate(product)
-                    for product in (row.items or [])
-                ],
-                extra=row.extra,
-                created_at=row.created_at,
-            )
+            result = await session.execute(_SELECT_BY_ORDER_ID, {"order_id": order_id})
+            row = result.mappings().one_or_none()
+        if row is None:
+            return None
+        return _processed_from_row(row)
@@ -1,14 +1,24 @@
 from __future__ import annotations
 
 import asyncio
-import re
-from typing import Any, Iterable, Protocol
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterable, Protocol
 
-from app.utils.http_client import AsyncHTTP
+from app.schemas.order import OrderProduct
+from app.utils.http_client import (
+    DEFAULT_MAX_KEEPALIVE,
+    AsyncHTTP,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+)
+
+logger = logging.getLogger("orderflow.product_provider")
 
 
 class ProductProvider(Protocol):
-    async def get_many(self, skus: Iterable[str]) -> dict[str, dict[str, Any]]:
+    async def get_many(self, items: Iterable[OrderProduct]) -> dict[str, dict[str, Any]]:
         """Return product data keyed by SKU."""
 
 
@@ -16,7 +26,27 @@ class ProductLookupError(RuntimeError):
     """Raised when a product cannot be retrieved from the external service."""
 
 
+class ProductServiceUnavailable(ProductLookupError):
+    """Raised without calling the service while its circuit breaker is open.
+
+    ``retry_after`` is the number of seconds until the breaker admits calls again.
+    """
+
+    def __init__(self, message: str, *, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class FakeStoreProductProvider:
+    """Serve products from an in-memory copy of the FakeStore catalog.
+
+    :meth:`start` opens a long-lived HTTP client and returns immediately; a
+    background task loads ``GET /products`` and refreshes it every
+    ``catalog_ttl`` seconds. SKUs missing from the catalog (including every SKU
+    until the first load finishes) fall back to ``GET /products/{id}`` and are
+    cached on success.
+    """
+
     def __init__(
         self,
         *,
@@ -24,36 +54,118 @@ class FakeStoreProductProvider:
         http_client_cls: type[AsyncHTTP] = AsyncHTTP,
         retries: int = 2,
         backoff: float = 0.5,
+        catalog_ttl: float = 3600.0,
+        max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
     ) -> None:
         self.base_url = base_url
         self._http_cls = http_client_cls
         self._retries = retries
         self._backoff = backoff
-        self._sku_pattern = re.compile(r"(\d+)$")
-
-    async def get_many(self, skus: Iterable[str]) -> dict[str, dict[str, Any]]:
-        unique = {sku: self._extract_product_id(sku) for sku in set(skus)}
-        async with self._http_cls(
-            base_url=self.base_url, retries=self._retries, backoff=self._backoff
-        ) as http:
-            tasks = {
-                sku: asyncio.create_task(http.get(f"/products/{product_id}"))
-                for sku, product_id in unique.items()
-            }
-
-            results: dict[str, dict[str, Any]] = {}
-            for sku, task in tasks.items():
-                try:
-                    results[sku] = await task
-                except Exception as exc:  # noqa: BLE001
-                    raise ProductLookupError(f"Failed to fetch product {sku}") from exc
-            return results
-
-    def _extract_product_id(self, sku: str) -> str:
-        match = self._sku_pattern.search(sku)
-        if not match:
+        self._catalog_ttl = catalog_ttl
+        self._max_keepalive = max_keepalive
+        self._catalog: dict[int, dict[str, Any]] = {}
+        self._refresh_task: asyncio.Task[None] | None = None
+        self._catalog_attempted = asyncio.Event()
+        self._http: AsyncHTTP | None = None
+        # Shared by every client this provider opens so a FakeStore outage trips
+        # one breaker instead of each lookup retrying into it.
+        self._breaker = CircuitBreaker()
+        self._retry_budget = RetryBudget()
+
+    async def start(self) -> None:
+        if self._refresh_task:
+            return
+        self._http = await self._new_client().__aenter__()
+        # The first load runs in the background so an unreachable FakeStore
+        # cannot hold up application startup.
+        self._refresh_task = asyncio.create_task(
+            self._refresh_loop(), name="product-catalog-refresh"
+        )
+
+    async def wait_for_catalog(self) -> None:
+        """Wait until the first catalog load after :meth:`start` has succeeded or failed."""
+        await self._catalog_attempted.wait()
+
+    async def close(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+        if self._http:
+            await self._http.__aexit__(None, None, None)
+            self._http = None
+
+    async def refresh_catalog(self) -> None:
+        async with self._client() as http:
+            products = await http.get("/products")
+        self._catalog = {product["id"]: product for product in products}
+        logger.info("Loaded %s products into the catalog cache.", len(self._catalog))
+
+    async def get_many(self, items: Iterable[OrderProduct]) -> dict[str, dict[str, Any]]:
+        product_ids = {item.sku: self._product_id(item) for item in items}
+        catalog = self._catalog
+        missing = [
+            product_id
+            for product_id in dict.fromkeys(product_ids.values())
+            if product_id not in catalog
+        ]
+        if missing:
+            async with self._client() as http:
+                fetched = await asyncio.gather(
+                    *(http.get(f"/products/{product_id}") for product_id in missing),
+                    return_exceptions=True,
+                )
+            for product_id, product in zip(missing, fetched):
+                if isinstance(product, CircuitOpenError):
+                    raise ProductServiceUnavailable(
+                        f"Product service unavailable; could not fetch product {product_id}",
+                        retry_after=product.retry_after,
+                    ) from product
+                if isinstance(product, BaseException):
+                    raise ProductLookupError(
+                        f"Failed to fetch product {product_id}"
+                    ) from product
+                catalog[product_id] = product
+        return {sku: catalog[product_id] for sku, product_id in product_ids.items()}
+
+    def _new_client(self) -> AsyncHTTP:
+        return self._http_cls(
+            base_url=self.base_url,
+            retries=self._retries,
+            backoff=self._backoff,
+            max_keepalive=self._max_keepalive,
+            breaker=self._breaker,
+            retry_budget=self._retry_budget,
+        )
+
+    @asynccontextmanager
+    async def _client(self) -> AsyncIterator[AsyncHTTP]:
+        """Yield the shared client, or a short-lived one when not started."""
+        if self._http is not None:
+            yield self._http
+            return
+        async with self._new_client() as http:
+            yield http
+
+    async def _refresh_loop(self) -> None:
+        try:
+            await self.refresh_catalog()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Failed to load product catalog (%s); using per-SKU lookups.", exc)
+        finally:
+            self._catalog_attempted.set()
+        while True:
+            await asyncio.sleep(self._catalog_ttl)
+            try:
+                await self.refresh_catalog()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Failed to refresh product catalog: %s", exc)
+
+    @staticmethod
+    def _product_id(item: OrderProduct) -> int:
+        if item.product_id is None:
             raise ProductLookupError(
-                f"Could not infer product id from SKU '{sku}'. "
+                f"Could not infer product id from SKU '{item.sku}'. "
                 "Use a SKU that ends with digits (e.g., 'P001')."
             )
-        return str(int(match.group(1)))
+        return item.product_id
@@ -1,11 +1,10 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
-from typing import Any
 
 from redis.asyncio import Redis
+from redis.exceptions import ResponseError
 
 from app.schemas.order import OrderCreate
 from app.services.order_processor import OrderProcessor
@@ -14,7 +13,13 @@ logger = logging.getLogger("orderflow.redis_consumer")
 
 
 class RedisOrderConsumer:
-    """Consume orders from a Redis list and feed them into the OrderProcessor."""
+    """Consume orders from a Redis list and feed them into the OrderProcessor.
+
+    Each read blocks on ``BLPOP`` for the first payload and then drains up to
+    ``batch_size - 1`` more with a single ``LPOP key count`` (Redis >= 6.2).
+    If that follow-up read fails the already popped payload is still returned;
+    servers that reject ``LPOP`` with a count fall back to one ``BLPOP`` per order.
+    """
 
     def __init__(
         self,
@@ -22,10 +27,12 @@ class RedisOrderConsumer:
         queue_name: str,
         *,
         poll_timeout: int = 1,
+        batch_size: int = 50,
     ) -> None:
         self._redis = redis
         self._queue_name = queue_name
         self._poll_timeout = max(1, poll_timeout)
+        self._batch_size = max(1, batch_size)
         self._task: asyncio.Task[None] | None = None
         self._stop_event = asyncio.Event()
         self._processor: OrderProcessor | None = None
@@ -51,7 +58,7 @@ class RedisOrderConsumer:
         processor = self._processor
         while not self._stop_event.is_set():
             try:
-                data = await self._redis.blpop(self._queue_name, timeout=self._poll_timeout)
+                payloads = await self._read_batch()
             except asyncio.CancelledError:
                 break
             except Exception as exc:  # noqa: BLE001
@@ -59,19 +66,45 @@ class RedisOrderConsumer:
                 await asyncio.sleep(1)
                 continue
 
-            if not data:
-                continue
+            orders: list[OrderCreate] = []
+            for payload in payloads:
+                try:
+                    order = OrderCreate.model_validate_json(payload)
+                except Exception as exc:  # noqa: BLE001
+                    logger.error("Invalid payload received from Redis: %s (%s)", payload, exc)
+                    continue
+
+                logger.info("Order %s read from Redis.", order.id)
+                orders.append(order)
+            # Enqueue together so the processor's dedup lookups share one query.
+            # A failed enqueue must not end the loop: the batch is already off Redis.
+            results = await asyncio.gather(
+                *(processor.enqueue(order) for order in orders), return_exceptions=True
+            )
+            for order, result in zip(orders, results):
+                if isinstance(result, Exception):
+                    logger.error("Failed to enqueue order %s from Redis: %s", order.id, result)
 
-            _, payload = data
+    async def _read_batch(self) -> list[bytes]:
+        data = await self._redis.blpop(self._queue_name, timeout=self._poll_timeout)
+        if not data:
+            return []
+        payloads = [data[1]]
+        if self._batch_size > 1:
+            # BLPOP already removed the first payload: never let a failed drain lose it.
             try:
-                raw: Any = json.loads(payload)
-                order = OrderCreate.model_validate(raw)
+                more = await self._redis.lpop(self._queue_name, self._batch_size - 1)
+            except ResponseError as exc:
+                logger.warning(
+                    "LPOP with a count is not supported (%s); reading one order at a time.", exc
+                )
+                self._batch_size = 1
             except Exception as exc:  # noqa: BLE001
-                logger.error("Invalid payload received from Redis: %s (%s)", payload, exc)
-                continue
-
-            logger.info("Order %s read from Redis.", order.id)
-            await processor.enqueue(order)
+                logger.warning("Failed to drain extra payloads from Redis: %s", exc)
+            else:
+                if more:
+                    payloads.extend(more)
+        return payloads
 
     async def close(self) -> None:
         await self._redis.aclose()
@@ -1,24 +1,208 @@
 # app/utils/http_client.py
 from __future__ import annotations
-import asyncio, time
+import asyncio, random, threading, time
+from collections import deque
+from functools import lru_cache
 from typing import Any, Mapping, Literal
 import httpx
 
+try:
+    import h2  # noqa: F401  # httpx's optional HTTP/2 backend (httpx[http2])
+    HTTP2_AVAILABLE = True
+except ModuleNotFoundError:  # pragma: no cover - plain httpx install
+    HTTP2_AVAILABLE = False
+
 Method = Literal["GET","POST","PUT","PATCH","DELETE","OPTIONS","HEAD"]
 Parse = Literal["json","text","bytes","response"]
+Jitter = Literal["full","none"]
 RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Safe to resend; POST/PATCH are retried only with an idempotency key or retry_non_idempotent.
+_IDEMPOTENT = frozenset({"GET","HEAD","OPTIONS","PUT","DELETE"})
+
+# Connection pool defaults shared by both clients; keep one client alive per
+# upstream (not one per request) so these keep-alive connections get reused.
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of sending a request while the circuit breaker is open.
+
+    ``retry_after`` is how many seconds remain until the breaker lets a probe through.
+    """
+
+    def __init__(self, message: str, *, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Closed -> open -> half-open breaker; share one instance across clients of an upstream.
+
+    Opens after ``failure_threshold`` consecutive failures (transport errors or
+    retryable statuses), rejects calls for ``recovery_timeout`` seconds, then lets
+    ``half_open_max`` probe calls through: a success closes it, a failure reopens it.
+    A probe that ends without an outcome (cancelled, unexpected error) gives its
+    slot back via :meth:`release`; slots held longer than ``recovery_timeout``
+    are reclaimed as well.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max: int = 1):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max = max(1, half_open_max)
+        self.state: Literal["closed","open","half_open"] = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self._opened_at < self.recovery_timeout:
+                    return False
+                self.state, self._probes = "half_open", 0
+            if self.state == "half_open":
+                if self._probes >= self.half_open_max:
+                    if now - self._probe_at < self.recovery_timeout:
+                        return False
+                    self._probes = 0  # earlier probes never reported back
+                self._probes += 1
+                self._probe_at = now
+            return True
+
+    def retry_after(self) -> float:
+        """Seconds until :meth:`allow` may admit a call again (0 when it already would)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                return max(0.0, self.recovery_timeout - (now - self._opened_at))
+            if self.state == "half_open" and self._probes >= self.half_open_max:
+                return max(0.0, self.recovery_timeout - (now - self._probe_at))
+            return 0.0
+
+    def release(self) -> None:
+        """Return a half-open probe slot whose call ended without a success or failure."""
+        with self._lock:
+            if self.state == "half_open" and self._probes:
+                self._probes -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state, self._failures = "closed", 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state, self._opened_at = "open", time.monotonic()
+
+class RetryBudget:
+    """Caps retries at ``ratio`` of the successful requests seen in the last ``window`` seconds.
+
+    ``min_retries`` per window are always allowed so an idle client can still retry.
+    """
+
+    def __init__(self, ratio: float = 0.1, window: float = 10.0, min_retries: int = 3):
+        self.ratio = ratio
+        self.window = window
+        self.min_retries = min_retries
+        self._successes: deque[float] = deque()
+        self._retries: deque[float] = deque()
+        self._lock = threading.Lock()
 
-def _build_headers(headers: Mapping[str,str] | None, bearer: str | None) -> dict[str,str]:
-    out = dict(headers or {})
+    def record_success(self) -> None:
+        with self._lock:
+            self._successes.append(time.monotonic())
+
+    def acquire_retry(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            for events in (self._successes, self._retries):
+                while events and now - events[0] > self.window:
+                    events.popleft()
+            retries = len(self._retries)
+            if retries >= self.min_retries and retries >= self.ratio * len(self._successes):
+                return False
+            self._retries.append(now)
+            return True
+
+def _base_headers(default_headers: Mapping[str,str] | None, bearer: str | None) -> dict[str,str]:
+    out = dict(default_headers or {})
     if bearer:
         out.setdefault("Authorization", f"Bearer {bearer}")
     return out
 
+def _build_headers(base: dict[str,str], headers: Mapping[str,str] | None,
+                   bearer: str | None) -> dict[str,str]:
+    # Precedence: client defaults < per-call bearer < per-call headers.
+    if not headers and not bearer:
+        return base  # shared, never mutated
+    out = {**base, "Authorization": f"Bearer {bearer}"} if bearer else dict(base)
+    if headers:
+        out.update(headers)
+    return out
+
+@lru_cache(maxsize=1024)
 def _full_url(base_url: str | None, path_or_url: str) -> str:
     if base_url and not path_or_url.startswith(("http://","https://")):
         return f"{base_url.rstrip('/')}/{path_or_url.lstrip('/')}"
     return path_or_url
 
+def _max_retries(client: "SyncHTTP | AsyncHTTP", method: str, idempotency_key: str | None) -> int:
+    if method in _IDEMPOTENT or idempotency_key is not None or client.retry_non_idempotent:
+        return client.retries
+    return 0
+
+def _retry_delay(client: "SyncHTTP | AsyncHTTP", attempt: int,
+                 deadline: float | None, now: float) -> float | None:
+    # None means the call's deadline is spent: give up instead of sleeping past it.
+    delay = _backoff_delay(client, attempt)
+    if deadline is None:
+        return delay
+    remaining = deadline - now
+    return min(delay, remaining) if remaining > 0 else None
+
+def _limits(client: "SyncHTTP | AsyncHTTP") -> httpx.Limits:
+    return httpx.Limits(max_connections=client.max_connections,
+                        max_keepalive_connections=client.max_keepalive,
+                        keepalive_expiry=client.keepalive_expiry)
+
+def _backoff_delay(client: "SyncHTTP | AsyncHTTP", attempt: int) -> float:
+    # Full jitter: a random point in [0, capped exponential] de-correlates retrying clients.
+    delay = min(client.max_backoff, client.backoff * (2 ** attempt))
+    if client.jitter == "full":
+        return client._rng.uniform(0, delay)
+    return delay
+
+def _check_circuit(client: "SyncHTTP | AsyncHTTP", url: str) -> None:
+    if client.breaker is not None and not client.breaker.allow():
+        raise CircuitOpenError(f"Circuit open; not calling {url}",
+                               retry_after=client.breaker.retry_after())
+
+def _record_status(client: "SyncHTTP | AsyncHTTP", status_code: int) -> None:
+    if status_code in RETRY_STATUSES:
+        _record_failure(client)
+        return
+    if client.breaker is not None:
+        client.breaker.record_success()
+    if client.retry_budget is not None:
+        client.retry_budget.record_success()
+
+def _record_failure(client: "SyncHTTP | AsyncHTTP") -> None:
+    if client.breaker is not None:
+        client.breaker.record_failure()
+
+def _release_probe(client: "SyncHTTP | AsyncHTTP") -> None:
+    if client.breaker is not None:
+        client.breaker.release()
+
+def _retry_allowed(client: "SyncHTTP | AsyncHTTP") -> bool:
+    return client.retry_budget is None or client.retry_budget.acquire_retry()
+
 def _parse(resp: httpx.Response, parse: Parse):
     if parse == "response":
         return resp
@@ -33,16 +217,37 @@ def _parse(resp: httpx.Response, parse: Parse):
 # ----------------- S Y N C -----------------
 class SyncHTTP:
     def __init__(self, base_url: str | None = None, *, timeout: float = 10.0,
-                 retries: int = 2, backoff: float = 0.5, follow_redirects: bool = True):
+                 retries: int = 2, backoff: float = 0.5, follow_redirects: bool = True,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+                 http2: bool = False, max_backoff: float = 30.0,
+                 jitter: Jitter = "full", seed: int | None = None,
+                 breaker: CircuitBreaker | None = None,
+                 retry_budget: RetryBudget | None = None,
+                 default_headers: Mapping[str,str] | None = None,
+                 bearer: str | None = None, retry_non_idempotent: bool = False):
         self.base_url = base_url
         self.timeout = timeout
         self.retries = retries
         self.backoff = backoff
         self.follow_redirects = follow_redirects
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self.breaker = breaker
+        self.retry_budget = retry_budget
+        self._base_headers = _base_headers(default_headers, bearer)
+        self.retry_non_idempotent = retry_non_idempotent
         self._client: httpx.Client | None = None
 
     def __enter__(self):
-        self._client = httpx.Client(timeout=self.timeout, follow_redirects=self.follow_redirects)
+        self._client = httpx.Client(timeout=self.timeout, follow_redirects=self.follow_redirects,
+                                    limits=_limits(self), http2=self.http2)
         return self
 
     def __exit__(self, exc_type, exc, tb):
@@ -54,7 +259,9 @@ class SyncHTTP:
                 params: Mapping[str, Any] | None = None,
                 json: Any | None = None, data: Any | None = None,
                 bearer: str | None = None, parse: Parse = "json",
-                raise_on_4xx_5xx: bool = True) -> Any:
+                raise_on_4xx_5xx: bool = True,
+                idempotency_key: str | None = None,
+                deadline_s: float | None = None) -> Any:
         if json is not None and data is not None:
             raise ValueError("Use 'json' or 'data', not both.")
         if self._client is None:
@@ -62,24 +269,41 @@ class SyncHTTP:
             with self as s:
                 return s.request(method, path_or_url, headers=headers, params=params,
                                  json=json, data=data, bearer=bearer,
-                                 parse=parse, raise_on_4xx_5xx=raise_on_4xx_5xx)
+                                 parse=parse, raise_on_4xx_5xx=raise_on_4xx_5xx,
+                                 idempotency_key=idempotency_key, deadline_s=deadline_s)
 
         url = _full_url(self.base_url, path_or_url)
-        hdrs = _build_headers(headers, bearer)
+        hdrs = _build_headers(self._base_headers, headers, bearer)
+        if idempotency_key is not None:
+            hdrs = {**hdrs, "Idempotency-Key": idempotency_key}
+        retries = _max_retries(self, method, idempotency_key)
+        deadline = None if deadline_s is None else time.monotonic() + deadline_s
+        # Locals for the retry loop: LOAD_FAST instead of attribute/global lookups.
+        client_request, retry_statuses, now = self._client.request, RETRY_STATUSES, time.monotonic
 
-        for attempt in range(self.retries + 1):
+        for attempt in range(retries + 1):
+            _check_circuit(self, url)
             try:
-                r = self._client.request(method, url, headers=hdrs, params=params, json=json, data=data)
+                r = client_request(method, url, headers=hdrs, params=params, json=json, data=data)
+                _record_status(self, r.status_code)
                 if raise_on_4xx_5xx:
                     r.raise_for_status()
                 return _parse(r, parse)
             except httpx.HTTPStatusError as e:
-                if attempt < self.retries and e.response.status_code in RETRY_STATUSES:
-                    time.sleep(self.backoff * (2 ** attempt)); continue
+                if (attempt < retries and e.response.status_code in retry_statuses
+                        and (delay := _retry_delay(self, attempt, deadline, now())) is not None
+                        and _retry_allowed(self)):
+                    time.sleep(delay); continue
                 raise
             except httpx.RequestError:
-                if attempt < self.retries:
-                    time.sleep(self.backoff * (2 ** attempt)); continue
+                _record_failure(self)
+                if (attempt < retries
+                        and (delay := _retry_delay(self, attempt, deadline, now())) is not None
+                        and _retry_allowed(self)):
+                    time.sleep(delay); continue
+                raise
+            except BaseException:
+                _release_probe(self)
                 raise
 
     def get(self, u, **kw):     return self.request("GET", u, **kw)
@@ -91,18 +315,41 @@ class SyncHTTP:
     def head(self, u, **kw):    return self.request("HEAD", u, **kw)
 
 # ----------------- A S Y N C -----------------
+# Async callers fan out many small requests to one origin, so HTTP/2 is on by
+# default here: they multiplex over a single connection per origin.
 class AsyncHTTP:
     def __init__(self, base_url: str | None = None, *, timeout: float = 10.0,
-                 retries: int = 2, backoff: float = 0.5, follow_redirects: bool = True):
+                 retries: int = 2, backoff: float = 0.5, follow_redirects: bool = True,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+                 http2: bool = HTTP2_AVAILABLE, max_backoff: float = 30.0,
+                 jitter: Jitter = "full", seed: int | None = None,
+                 breaker: CircuitBreaker | None = None,
+                 retry_budget: RetryBudget | None = None,
+                 default_headers: Mapping[str,str] | None = None,
+                 bearer: str | None = None, retry_non_idempotent: bool = False):
         self.base_url = base_url
         self.timeout = timeout
         self.retries = retries
         self.backoff = backoff
         self.follow_redirects = follow_redirects
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self.breaker = breaker
+        self.retry_budget = retry_budget
+        self._base_headers = _base_headers(default_headers, bearer)
+        self.retry_non_idempotent = retry_non_idempotent
         self._client: httpx.AsyncClient | None = None
 
     async def __aenter__(self):
-        self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=self.follow_redirects)
+        self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=self.follow_redirects,
+                                         limits=_limits(self), http2=self.http2)
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
@@ -114,31 +361,50 @@ class AsyncHTTP:
                       params: Mapping[str, Any] | None = None,
                       json: Any | None = None, data: Any | None = None,
                       bearer: str | None = None, parse: Parse = "json",
-                      raise_on_4xx_5xx: bool = True) -> Any:
+                      raise_on_4xx_5xx: bool = True,
+                      idempotency_key: str | None = None,
+                      deadline_s: float | None = None) -> Any:
         if json is not None and data is not None:
             raise ValueError("Use 'json' or 'data', not both.")
         if self._client is None:
             async with self as s:
                 return await s.request(method, path_or_url, headers=headers, params=params,
                                        json=json, data=data, bearer=bearer,
-                                       parse=parse, raise_on_4xx_5xx=raise_on_4xx_5xx)
+                                       parse=parse, raise_on_4xx_5xx=raise_on_4xx_5xx,
+                                       idempotency_key=idempotency_key, deadline_s=deadline_s)
 
         url = _full_url(self.base_url, path_or_url)
-        hdrs = _build_headers(headers, bearer)
+        hdrs = _build_headers(self._base_headers, headers, bearer)
+        if idempotency_key is not None:
+            hdrs = {**hdrs, "Idempotency-Key": idempotency_key}
+        retries = _max_retries(self, method, idempotency_key)
+        loop = asyncio.get_running_loop()
+        deadline = None if deadline_s is None else loop.time() + deadline_s
+        client_request, retry_statuses, now = self._client.request, RETRY_STATUSES, loop.time
 
-        for attempt in range(self.retries + 1):
+        for attempt in range(retries + 1):
+            _check_circuit(self, url)
             try:
-                r = await self._client.request(method, url, headers=hdrs, params=params, json=json, data=data)
+                r = await client_request(method, url, headers=hdrs, params=params, json=json, data=data)
+                _record_status(self, r.status_code)
                 if raise_on_4xx_5xx:
                     r.raise_for_status()
                 return _parse(r, parse)
             except httpx.HTTPStatusError as e:
-                if attempt < self.retries and e.response.status_code in RETRY_STATUSES:
-                    await asyncio.sleep(self.backoff * (2 ** attempt)); continue
+                if (attempt < retries and e.response.status_code in retry_statuses
+                        and (delay := _retry_delay(self, attempt, deadline, now())) is not None
+                        and _retry_allowed(self)):
+                    await asyncio.sleep(delay); continue
                 raise
             except (httpx.RequestError, asyncio.TimeoutError):
-                if attempt < self.retries:
-                    await asyncio.sleep(self.backoff * (2 ** attempt)); continue
+                _record_failure(self)
+                if (attempt < retries
+                        and (delay := _retry_delay(self, attempt, deadline, now())) is not None
+                        and _retry_allowed(self)):
+                    await asyncio.sleep(delay); continue
+                raise
+            except BaseException:  # cancellation included
+                _release_probe(self)
                 raise
 
     async def get(self, u, **kw):     return await self.request("GET", u, **kw)
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import argparse
-import ast
+import math
 import sys
 from typing import Any, Sequence
 
 from app.functions import call_function, list_functions
 
+_BOOL_MAP: dict[str, bool | None] = {"true": True, "false": False, "none": None}
+_MISSING = object()
+
 
 def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -47,16 +50,26 @@ def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
 def coerce_value(raw: str | None) -> Any:
     if raw is None:
         return None
+    # Cheap conversions first; only structured literals need ast.literal_eval.
+    value = _BOOL_MAP.get(raw.lower(), _MISSING)
+    if value is not _MISSING:
+        return value
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        value = float(raw)
+    except ValueError:
+        pass
+    else:
+        if math.isfinite(value):
+            return value
+    import ast  # only needed for container literals; keeps `--list` startup lean
+
     try:
         return ast.literal_eval(raw)
     except (ValueError, SyntaxError):
-        lowered = raw.lower()
-        if lowered == "none":
-            return None
-        if lowered == "true":
-            return True
-        if lowered == "false":
-            return False
         return raw
 
 
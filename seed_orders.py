@@ -15,38 +15,70 @@ from __future__ import annotations
 import argparse
 import asyncio
 import json
-import random
 from datetime import datetime, timezone
-from typing import Iterable
+from itertools import islice
+from typing import Iterable, Iterator
 
-import httpx
+import numpy as np
 
 try:
-    from redis.asyncio import Redis
-except ModuleNotFoundError:  # pragma: no cover - Redis mode is optional
-    Redis = None  # type: ignore[assignment]
-
-SKU_POOL = [f"P{i:03d}" for i in range(1, 21)]  # FakeStore API has ids 1 through 20
-
-
-def build_order(order_id: int) -> dict:
-    num_items = random.randint(1, 4)
-    selected_skus = random.sample(SKU_POOL, k=num_items)
-    items: list[dict[str, object]] = []
-    for sku in selected_skus:
-        items.append(
-            {
-                "sku": sku,
-                "quantity": random.randint(1, 5),
-                "unit_price": round(random.uniform(5, 150), 2),
-            }
+    import uvloop
+except ModuleNotFoundError:  # pragma: no cover - uvloop is not available on Windows
+    uvloop = None  # type: ignore[assignment]
+
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - stdlib fallback
+    orjson = None  # type: ignore[assignment]
+
+SKU_POOL = tuple(f"P{i:03d}" for i in range(1, 21))  # FakeStore API has ids 1 through 20
+_SKU_ARRAY = np.array(SKU_POOL, dtype=object)  # index with an int array, get str back
+MAX_ITEMS = 4
+REDIS_PUSH_CHUNK = 10_000  # payloads per RPUSH, bounds the size of one command
+BUILD_BATCH = 1_000  # orders generated per batch while streaming
+_JSON_HDR = {"content-type": "application/json"}
+
+
+def _dumps(order: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(order)
+    return json.dumps(order, separators=(",", ":")).encode()
+
+
+def build_orders(
+    count: int, rng: np.random.Generator, submitted_at: str, *, start: int = 1
+) -> list[dict]:
+    """Build ``count`` orders numbered from ``start`` using a few batched RNG draws."""
+    num_items = rng.integers(1, MAX_ITEMS + 1, count)
+    total_items = int(num_items.sum())
+    next_quantity = iter(rng.integers(1, 6, total_items).tolist()).__next__
+    next_price = iter(np.round(rng.uniform(5, 150, total_items), 2).tolist()).__next__
+    # Distinct SKUs per order: the first columns of a random permutation of the pool.
+    sku_indices = rng.random((count, len(SKU_POOL))).argsort(axis=1)[:, :MAX_ITEMS]
+    skus_per_order = _SKU_ARRAY[sku_indices].tolist()
+    return [
+        {
+            "id": order_id,
+            "customer": f"Customer {order_id}",
+            "items": [
+                {"sku": sku, "quantity": next_quantity(), "unit_price": next_price()}
+                for sku in skus[:size]
+            ],
+            "submitted_at": submitted_at,
+        }
+        for order_id, size, skus in zip(
+            range(start, start + count), num_items.tolist(), skus_per_order
         )
-    return {
-        "id": order_id,
-        "customer": f"Customer {order_id}",
-        "items": items,
-        "submitted_at": datetime.now(timezone.utc).isoformat(),
-    }
+    ]
+
+
+def iter_orders(
+    count: int, rng: np.random.Generator, submitted_at: str
+) -> Iterator[dict]:
+    """Yield orders ``1..count``, generating them ``BUILD_BATCH`` at a time."""
+    for start in range(1, count + 1, BUILD_BATCH):
+        size = min(BUILD_BATCH, count + 1 - start)
+        yield from build_orders(size, rng, submitted_at, start=start)
 
 
 async def publish_api(
@@ -55,31 +87,59 @@ async def publish_api(
     *,
     concurrency: int = 10,
 ) -> None:
-    semaphore = asyncio.Semaphore(concurrency)
+    import httpx  # imported per mode so the other mode never loads it
+
+    # `concurrency` workers each keep one request in flight on a pooled connection.
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    # Bounded so generation only runs a little ahead of the senders.
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def _produce() -> None:
+        # Encode here so senders post ready-made bytes instead of httpx's json=.
+        for order in orders:
+            await queue.put(_dumps(order))
+        for _ in range(concurrency):
+            await queue.put(None)
 
-    async def _send(client: httpx.AsyncClient, order: dict) -> None:
-        async with semaphore:
-            resp = await client.post("/api/v1/orders", json=order)
+    async def _send(client: httpx.AsyncClient) -> None:
+        while (body := await queue.get()) is not None:
+            resp = await client.post("/api/v1/orders", content=body, headers=_JSON_HDR)
             resp.raise_for_status()
 
-    async with httpx.AsyncClient(base_url=base_url, timeout=10) as client:
-        await asyncio.gather(*[_send(client, order) for order in orders])
+    timeout = httpx.Timeout(10)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=timeout, limits=limits, http2=True
+    ) as client:
+        # A failed send cancels the producer and the other workers.
+        async with asyncio.TaskGroup() as tasks:
+            tasks.create_task(_produce())
+            for _ in range(concurrency):
+                tasks.create_task(_send(client))
 
 
 async def publish_redis(
     redis_url: str,
     queue: str,
     orders: Iterable[dict],
+    *,
+    check: bool = False,
 ) -> None:
-    if Redis is None:
+    try:
+        from redis.asyncio import Redis
+    except ModuleNotFoundError:  # pragma: no cover - Redis mode is optional
         raise RuntimeError(
             "Install the 'redis' package to enable Redis mode (pip install redis)."
-        )
-    redis = Redis.from_url(redis_url)
+        ) from None
+    # Pushes are sequential on one connection, so the default pool is enough.
+    redis = Redis.from_url(redis_url, socket_keepalive=True)
     try:
-        await redis.ping()
-        for order in orders:
-            await redis.rpush(queue, json.dumps(order))
+        if check:
+            await redis.ping()
+        orders = iter(orders)
+        while payloads := [_dumps(order) for order in islice(orders, REDIS_PUSH_CHUNK)]:
+            await redis.rpush(queue, *payloads)
     finally:
         await redis.aclose()
 
@@ -98,6 +158,12 @@ def parse_args() -> argparse.Namespace:
         default=100,
         help="Number of orders to generate.",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Maximum in-flight requests (api mode).",
+    )
     parser.add_argument(
         "--base-url",
         default="http://localhost:8000",
@@ -113,6 +179,11 @@ def parse_args() -> argparse.Namespace:
         default="orderflow:orders",
         help="Redis list name (redis mode).",
     )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Ping Redis before pushing (redis mode).",
+    )
     parser.add_argument(
         "--seed",
         type=int,
@@ -124,17 +195,20 @@ def parse_args() -> argparse.Namespace:
 
 def main() -> None:
     args = parse_args()
-    if args.seed is not None:
-        random.seed(args.seed)
-
-    orders = [build_order(order_id) for order_id in range(1, args.count + 1)]
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    # One timestamp for the whole run, formatted once.
+    submitted_at = datetime.now(timezone.utc).isoformat()
+    orders = iter_orders(args.count, np.random.default_rng(args.seed), submitted_at)
 
     if args.mode == "api":
         print(f"Sending {args.count} orders to {args.base_url} ...")
-        asyncio.run(publish_api(args.base_url, orders))
+        asyncio.run(publish_api(args.base_url, orders, concurrency=args.concurrency))
     else:
         print(f"Pushing {args.count} orders to Redis {args.redis_url}/{args.redis_queue} ...")
-        asyncio.run(publish_redis(args.redis_url, args.redis_queue, orders))
+        asyncio.run(
+            publish_redis(args.redis_url, args.redis_queue, orders, check=args.check)
+        )
     print("Done.")
 
 
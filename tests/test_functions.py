@@ -1,21 +1,31 @@
 from __future__ import annotations
 
+import io
 import subprocess
 import sys
+from contextlib import redirect_stderr, redirect_stdout
+from dataclasses import dataclass
 from pathlib import Path
 
 import pytest
 
+from main import coerce_value, main
+
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
 
-def run_cli(*args: str) -> subprocess.CompletedProcess[str]:
-    return subprocess.run(
-        [sys.executable, str(PROJECT_ROOT / "main.py"), *args],
-        capture_output=True,
-        text=True,
-        check=False,
-    )
+@dataclass
+class CliResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+def run_cli(*args: str) -> CliResult:
+    """Run the CLI in-process; see ``test_cli_runs_as_a_script`` for the real entrypoint."""
+    with redirect_stdout(io.StringIO()) as out, redirect_stderr(io.StringIO()) as err:
+        returncode = main(list(args))
+    return CliResult(returncode, out.getvalue(), err.getvalue())
 
 
 def test_registered_functions_are_available() -> None:
@@ -46,9 +56,59 @@ def test_cli_executes_registered_function(args: tuple[str, ...], expected: str)
     assert result.stderr == ""
 
 
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ("5", 5),
+        ("-2.5", -2.5),
+        ("TRUE", True),
+        ("None", None),
+        ("[1, 2]", [1, 2]),
+        ("0x10", 16),
+        ("nan", "nan"),
+        ("HOLA", "HOLA"),
+    ],
+)
+def test_coerce_value(raw: str, expected: object) -> None:
+    assert coerce_value(raw) == expected
+
+
 def test_cli_list_option_outputs_registered_functions() -> None:
     result = run_cli("--list")
     assert result.returncode == 0
     output = {line.strip() for line in result.stdout.splitlines() if line.strip()}
     assert {"add", "subtract", "to_lowercase"}.issubset(output)
     assert result.stderr == ""
+
+
+def test_cli_runs_as_a_script() -> None:
+    result = subprocess.run(
+        [sys.executable, str(PROJECT_ROOT / "main.py"), "add", "5", "7"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert result.returncode == 0
+    assert result.stdout.strip() == "12"
+    assert result.stderr == ""
+
+
+def test_function_lookup_is_case_insensitive() -> None:
+    from app.functions import get_function
+
+    assert get_function("ADD") is get_function("add")
+    with pytest.raises(KeyError, match="not registered"):
+        get_function("missing")
+
+
+def test_all_function_modules_are_listed() -> None:
+    import pkgutil
+
+    import app.functions as functions
+
+    on_disk = {
+        info.name
+        for info in pkgutil.iter_modules(functions.__path__)
+        if not info.name.startswith("_") and info.name != "registry"
+    }
+    assert on_disk == set(functions.__all_modules__)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils.http_client import (
+    AsyncHTTP,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+    SyncHTTP,
+    _backoff_delay,
+    _build_headers,
+    _retry_delay,
+)
+
+
+def _mock_client(client: SyncHTTP, statuses: list[int]) -> list[int]:
+    calls: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(len(calls))
+        return httpx.Response(statuses[min(len(calls) - 1, len(statuses) - 1)], json={})
+
+    client._client = httpx.Client(transport=httpx.MockTransport(handler))
+    return calls
+
+
+def test_full_jitter_backoff_is_capped_and_seeded() -> None:
+    first = SyncHTTP(backoff=0.5, max_backoff=4.0, seed=7)
+    second = SyncHTTP(backoff=0.5, max_backoff=4.0, seed=7)
+
+    delays = [_backoff_delay(first, attempt) for attempt in range(8)]
+    assert delays == [_backoff_delay(second, attempt) for attempt in range(8)]
+    assert all(0 <= delay <= min(4.0, 0.5 * 2**attempt) for attempt, delay in enumerate(delays))
+
+
+def test_backoff_without_jitter_is_capped_exponential() -> None:
+    client = AsyncHTTP(backoff=0.5, max_backoff=3.0, jitter="none")
+    assert [_backoff_delay(client, attempt) for attempt in range(4)] == [0.5, 1.0, 2.0, 3.0]
+
+
+def test_breaker_opens_then_recovers_through_half_open() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60.0)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    breaker._opened_at -= 60.0
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_cancelled_probe_releases_half_open_slot() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60.0)
+    breaker.record_failure()
+    breaker._opened_at -= 60.0
+    hang = True
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if hang:
+            await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def run() -> None:
+        nonlocal hang
+        async with AsyncHTTP(base_url="http://upstream", breaker=breaker) as client:
+            client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.get("/items"), timeout=0.01)
+            assert breaker.state == "half_open"
+
+            hang = False
+            await client.get("/items")
+        assert breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_unreported_probe_slot_expires_after_recovery_timeout() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert breaker.allow()  # the first probe never reported back; its slot is reclaimed
+
+
+def test_open_breaker_rejects_without_calling_upstream() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60.0)
+    client = SyncHTTP(base_url="http://upstream", retries=3, backoff=0, breaker=breaker)
+    calls = _mock_client(client, [503])
+
+    with pytest.raises(CircuitOpenError):
+        client.request("GET", "/items")
+    assert len(calls) == 2
+
+    with pytest.raises(CircuitOpenError):
+        client.request("GET", "/items")
+    assert len(calls) == 2
+
+
+def test_exhausted_retry_budget_stops_retrying() -> None:
+    budget = RetryBudget(ratio=0.0, min_retries=1)
+    client = SyncHTTP(base_url="http://upstream", retries=3, backoff=0, retry_budget=budget)
+    calls = _mock_client(client, [503])
+
+    with pytest.raises(httpx.HTTPStatusError):
+        client.request("GET", "/items")
+    assert len(calls) == 2
+
+
+def test_base_headers_are_shared_until_a_call_overrides_them() -> None:
+    client = SyncHTTP(default_headers={"Accept": "application/json"}, bearer="client")
+    base = client._base_headers
+
+    assert base == {"Accept": "application/json", "Authorization": "Bearer client"}
+    assert _build_headers(base, None, None) is base
+    assert _build_headers(base, None, "call")["Authorization"] == "Bearer call"
+    merged = _build_headers(base, {"Authorization": "Basic x", "X-Id": "1"}, "call")
+    assert merged == {"Accept": "application/json", "Authorization": "Basic x", "X-Id": "1"}
+    assert base["Authorization"] == "Bearer client"
+
+
+def test_post_is_retried_only_with_an_idempotency_key() -> None:
+    client = SyncHTTP(base_url="http://upstream", retries=2, backoff=0)
+    calls = _mock_client(client, [503, 200])
+
+    with pytest.raises(httpx.HTTPStatusError):
+        client.request("POST", "/orders", json={})
+    assert len(calls) == 1
+
+    calls.clear()
+    client.request("POST", "/orders", json={}, idempotency_key="order-1")
+    assert len(calls) == 2
+
+
+def test_retry_delay_is_clamped_to_the_deadline() -> None:
+    client = SyncHTTP(backoff=1.0, jitter="none")
+
+    assert _retry_delay(client, 2, None, 0.0) == 4.0
+    assert _retry_delay(client, 2, 10.0, 8.5) == 1.5
+    assert _retry_delay(client, 2, 10.0, 10.0) is None
+
+
+def test_spent_deadline_stops_retrying() -> None:
+    client = SyncHTTP(base_url="http://upstream", retries=3, backoff=0)
+    calls = _mock_client(client, [503])
+
+    with pytest.raises(httpx.HTTPStatusError):
+        client.request("GET", "/items", deadline_s=0)
+    assert len(calls) == 1
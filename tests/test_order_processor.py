@@ -2,39 +2,62 @@ from __future__ import annotations
 
 import asyncio
 from datetime import datetime, timezone
-from typing import Iterable
+from typing import AsyncIterator, Iterable
 
 import pytest
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.pool import StaticPool
-from app.schemas.order import OrderCreate
-from app.services.order_processor import OrderProcessor
-from app.services.product_provider import ProductLookupError, ProductProvider
+from app.schemas.order import OrderCreate, OrderProduct
+from app.services import order_processor
+from app.services.order_processor import OrderProcessor, UnknownCursorError, _DedupBatcher
+from app.services.product_provider import (
+    ProductLookupError,
+    ProductProvider,
+    ProductServiceUnavailable,
+)
 
 
 pytestmark = pytest.mark.anyio
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def anyio_backend():
     return "asyncio"
 
 
 class StubProvider(ProductProvider):
-    def __init__(self, products: dict[str, dict], *, fail_times: int = 0) -> None:
+    def __init__(
+        self,
+        products: dict[str, dict],
+        *,
+        fail_times: int = 0,
+        unavailable_times: int = 0,
+        retry_after: float = 0.01,
+    ) -> None:
         self._products = products
         self.fail_times = fail_times
+        self.unavailable_times = unavailable_times
+        self.retry_after = retry_after
         self.calls = 0
 
-    async def get_many(self, skus: Iterable[str]) -> dict[str, dict]:
+    async def get_many(self, items: Iterable[OrderProduct]) -> dict[str, dict]:
         self.calls += 1
+        if self.calls <= self.unavailable_times:
+            raise ProductServiceUnavailable("breaker open", retry_after=self.retry_after)
         if self.calls <= self.fail_times:
             raise ProductLookupError("simulated failure")
-        return {sku: self._products.get(sku, {}) for sku in skus}
+        return {item.sku: self._products.get(item.sku, {}) for item in items}
 
 
-async def create_session_factory() -> async_sessionmaker[AsyncSession]:
+@pytest.fixture(scope="module")
+async def engine() -> AsyncIterator[AsyncEngine]:
+    """One in-memory database per module; ``session_factory`` empties it per test."""
     engine = create_async_engine(
         "sqlite+aiosqlite:///:memory:",
         future=True,
@@ -61,9 +84,35 @@ async def create_session_factory() -> async_sessionmaker[AsyncSession]:
                 """
             )
         )
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM processed_orders"))
     return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+def test_order_product_id_follows_sku() -> None:
+    product = OrderProduct(sku="P001", quantity=1, unit_price=10)
+
+    assert product.product_id == 1
+    assert product.model_copy(update={"sku": "X-17"}).product_id == 17
+    assert OrderProduct.model_construct(sku="SKU-X", quantity=1, unit_price=1).product_id is None
+    assert "product_id" not in product.model_dump()
+
+
+def test_order_product_cents_follow_unit_price() -> None:
+    product = OrderProduct(sku="P001", quantity=1, unit_price=10)
+
+    assert product.unit_price_cents == 1000
+    assert product.model_copy(update={"unit_price": 20}).unit_price_cents == 2000
+    assert OrderProduct.model_construct(sku="P001", quantity=1, unit_price=12.5).unit_price_cents == 1250
+    assert "unit_price_cents" not in product.model_dump()
+
+
 def sample_order(order_id: int = 1) -> OrderCreate:
     return OrderCreate.model_validate(
         {
@@ -78,8 +127,7 @@ def sample_order(order_id: int = 1) -> OrderCreate:
     )
 
 
-async def test_order_is_processed_and_persisted():
-    session_factory = await create_session_factory()
+async def test_order_is_processed_and_persisted(session_factory):
     provider = StubProvider(
         {
             "P001": {"id": 1, "title": "Widget", "price": 120, "category": "tools"},
@@ -110,8 +158,7 @@ async def test_order_is_processed_and_persisted():
     await processor.stop()
 
 
-async def test_order_retries_on_failure():
-    session_factory = await create_session_factory()
+async def test_order_retries_on_failure(session_factory):
     provider = StubProvider(
         {
             "P001": {"id": 1, "title": "Widget", "price": 120},
@@ -144,8 +191,81 @@ async def test_order_retries_on_failure():
     await processor.stop()
 
 
-async def test_duplicate_orders_are_ignored():
-    session_factory = await create_session_factory()
+async def test_open_breaker_does_not_spend_retries(session_factory):
+    provider = StubProvider({"P001": {"id": 1, "price": 10}}, unavailable_times=4)
+    processor = OrderProcessor(
+        session_factory,
+        product_provider=provider,
+        concurrency=1,
+        max_retries=1,
+    )
+
+    await processor.start()
+    order = sample_order(8)
+    await processor.enqueue(order)
+    await asyncio.wait_for(processor.wait_for_all(), timeout=2)
+
+    assert await processor.get_processed(order.id) is not None
+    assert provider.calls == 5
+
+    await processor.stop()
+
+
+async def test_deferred_order_does_not_block_the_worker(session_factory):
+    provider = StubProvider(
+        {"P001": {"id": 1, "price": 10}, "P002": {"id": 2, "price": 20}},
+        unavailable_times=1,
+        retry_after=0.3,
+    )
+    processor = OrderProcessor(session_factory, product_provider=provider, concurrency=1)
+
+    await processor.start()
+    await processor.enqueue(sample_order(1))
+    await asyncio.sleep(0.05)
+    await processor.enqueue(sample_order(2))
+    await asyncio.sleep(0.1)
+    assert await processor.get_processed(2) is not None
+    assert await processor.get_processed(1) is None
+
+    await asyncio.wait_for(processor.wait_for_all(), timeout=2)
+    assert await processor.get_processed(1) is not None
+
+    await processor.stop()
+
+
+async def test_deferrals_are_capped_then_count_as_attempts(session_factory):
+    provider = StubProvider({"P001": {"id": 1, "price": 10}}, unavailable_times=100)
+    processor = OrderProcessor(
+        session_factory,
+        product_provider=provider,
+        concurrency=1,
+        max_retries=1,
+        max_deferrals=2,
+    )
+
+    await processor.start()
+    await processor.enqueue(sample_order(9))
+    await asyncio.wait_for(processor.wait_for_all(), timeout=2)
+
+    assert await processor.get_processed(9) is None
+    assert provider.calls == 4  # 2 deferrals, then the first try and 1 retry
+
+    await processor.stop()
+
+
+async def test_stop_drops_deferred_orders(session_factory):
+    provider = StubProvider({"P001": {"id": 1, "price": 10}}, unavailable_times=1, retry_after=30)
+    processor = OrderProcessor(session_factory, product_provider=provider, concurrency=1)
+
+    await processor.start()
+    await processor.enqueue(sample_order(10))
+    await asyncio.sleep(0.05)
+    await asyncio.wait_for(processor.stop(), timeout=1)
+
+    assert provider.calls == 1
+
+
+async def test_duplicate_orders_are_ignored(session_factory):
     provider = StubProvider({"P001": {"id": 1, "price": 10}})
     processor = OrderProcessor(
         session_factory,
@@ -172,3 +292,127 @@ async def test_duplicate_orders_are_ignored():
     assert provider.calls == 1  # no additional calls
 
     await processor.stop()
+
+
+async def test_concurrent_enqueues_share_one_dedup_query(session_factory):
+    opened = 0
+
+    def counting_factory() -> AsyncSession:
+        nonlocal opened
+        opened += 1
+        return session_factory()
+
+    provider = StubProvider({"P001": {"id": 1, "price": 10}, "P002": {"id": 2, "price": 20}})
+    processor = OrderProcessor(
+        counting_factory,  # type: ignore[arg-type]
+        product_provider=provider,
+        concurrency=1,
+        max_retries=1,
+    )
+
+    await asyncio.gather(*(processor.enqueue(sample_order(i)) for i in range(1, 6)))
+    assert opened == 1
+
+    await processor.start()
+    await asyncio.wait_for(processor.wait_for_all(), timeout=2)
+    assert len(await processor.list_processed()) == 5
+
+    await processor.stop()
+
+
+async def test_closing_dedup_batcher_cancels_in_flight_checks():
+    class SlowSession:
+        async def __aenter__(self) -> "SlowSession":
+            return self
+
+        async def __aexit__(self, *exc: object) -> None:
+            return None
+
+        async def scalars(self, *args: object) -> None:
+            await asyncio.sleep(10)
+
+    batcher = _DedupBatcher(SlowSession, max_delay=0)  # type: ignore[arg-type]
+    check = asyncio.create_task(batcher.check(1))
+    await asyncio.sleep(0.01)
+
+    await batcher.close()
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(check, timeout=1)
+
+
+async def test_list_processed_paginates_with_cursor(session_factory):
+    provider = StubProvider({"P001": {"id": 1, "price": 10}, "P002": {"id": 2, "price": 20}})
+    processor = OrderProcessor(
+        session_factory,
+        product_provider=provider,
+        concurrency=1,
+        max_retries=1,
+    )
+
+    await processor.start()
+    for order_id in (1, 2, 3):
+        await processor.enqueue(sample_order(order_id))
+        await asyncio.wait_for(processor.wait_for_all(), timeout=2)
+
+    first_page = await processor.list_processed(limit=2)
+    assert [order.order_id for order in first_page] == [3, 2]
+    assert first_page[0].items[0].sku == "P001"
+
+    second_page = await processor.list_processed(limit=2, before=first_page[-1].order_id)
+    assert [order.order_id for order in second_page] == [1]
+    assert await processor.list_processed(limit=2, before=1) == []
+    with pytest.raises(UnknownCursorError):
+        await processor.list_processed(limit=2, before=404)
+
+    await processor.stop()
+
+
+async def test_large_order_cent_totals_and_offloaded_listing(session_factory, monkeypatch):
+    monkeypatch.setattr(order_processor, "_OFFLOAD_MIN_ITEMS", 40)
+    items = [
+        {"sku": f"P{index:03d}", "quantity": index % 7 + 1, "unit_price": 0.1 * index + 0.05}
+        for index in range(1, 41)
+    ]
+    processor = OrderProcessor(
+        session_factory,
+        product_provider=StubProvider({}),
+        concurrency=1,
+        max_retries=1,
+    )
+
+    await processor.start()
+    order = OrderCreate.model_validate(
+        {
+            "id": 500,
+            "customer": "Bulk Buyer",
+            "submitted_at": "2025-01-01T10:30:00Z",
+            "items": items,
+        }
+    )
+    await processor.enqueue(order)
+    await asyncio.wait_for(processor.wait_for_all(), timeout=2)
+
+    stored = await processor.get_processed(order.id)
+    assert stored is not None
+    expected = [round(item.unit_price * item.quantity, 2) for item in order.items]
+    assert [item.line_total for item in stored.items] == expected
+    assert stored.total == round(sum(expected), 2)
+
+    offloaded: list[object] = []
+    to_thread = asyncio.to_thread
+
+    async def spy_to_thread(func, /, *args, **kwargs):
+        offloaded.append(func)
+        return await to_thread(func, *args, **kwargs)
+
+    monkeypatch.setattr(order_processor.asyncio, "to_thread", spy_to_thread)
+    assert await processor.list_processed() == [stored]
+    assert offloaded == [order_processor._processed_from_rows]
+
+    offloaded.clear()
+    monkeypatch.setattr(order_processor, "_OFFLOAD_MIN_ITEMS", 41)
+    assert await processor.list_processed() == [stored]
+    assert offloaded == []
+
+    await processor.stop()
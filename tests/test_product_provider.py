@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from app.schemas.order import OrderProduct
+from app.services.product_provider import (
+    FakeStoreProductProvider,
+    ProductLookupError,
+    ProductServiceUnavailable,
+)
+from app.utils.http_client import CircuitOpenError
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+CATALOG = [
+    {"id": 1, "title": "Widget", "price": 120},
+    {"id": 2, "title": "Gadget", "price": 55.5},
+]
+
+
+class FakeHTTP:
+    requests: list[str] = []
+    opened = 0
+
+    def __init__(self, **_: Any) -> None:
+        FakeHTTP.opened += 1
+
+    async def __aenter__(self) -> "FakeHTTP":
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        return None
+
+    async def get(self, path: str) -> Any:
+        FakeHTTP.requests.append(path)
+        if path == "/products":
+            return CATALOG
+        if path == "/products/3":
+            return {"id": 3, "title": "Doohickey", "price": 9.99}
+        if path == "/products/5":
+            raise CircuitOpenError("Circuit open", retry_after=12.5)
+        raise RuntimeError("not found")
+
+
+def items(*skus: str) -> list[OrderProduct]:
+    return [OrderProduct(sku=sku, quantity=1, unit_price=1) for sku in skus]
+
+
+@pytest.fixture
+def provider():
+    FakeHTTP.requests = []
+    FakeHTTP.opened = 0
+    return FakeStoreProductProvider(http_client_cls=FakeHTTP)  # type: ignore[arg-type]
+
+
+async def test_catalog_hits_skip_http(provider):
+    await provider.start()
+    await provider.wait_for_catalog()
+    try:
+        products = await provider.get_many(items("P001", "P002"))
+    finally:
+        await provider.close()
+
+    assert products["P001"]["title"] == "Widget"
+    assert products["P002"]["price"] == 55.5
+    assert FakeHTTP.requests == ["/products"]
+
+
+async def test_started_provider_reuses_one_client(provider):
+    await provider.start()
+    await provider.wait_for_catalog()
+    try:
+        await provider.get_many(items("P003"))
+        await provider.get_many(items("P001", "P003"))
+    finally:
+        await provider.close()
+
+    assert FakeHTTP.opened == 1
+    assert FakeHTTP.requests == ["/products", "/products/3"]
+
+
+async def test_start_does_not_wait_for_the_catalog(provider):
+    await provider.start()
+    try:
+        assert FakeHTTP.requests == []
+        await provider.wait_for_catalog()
+        assert FakeHTTP.requests == ["/products"]
+    finally:
+        await provider.close()
+
+
+async def test_catalog_miss_falls_back_and_is_cached(provider):
+    first = await provider.get_many(items("P003"))
+    second = await provider.get_many(items("P003"))
+
+    assert first == second
+    assert FakeHTTP.requests == ["/products/3"]
+
+
+async def test_failed_lookup_raises(provider):
+    with pytest.raises(ProductLookupError):
+        await provider.get_many(items("P004"))
+
+
+async def test_open_circuit_raises_unavailable_with_retry_after(provider):
+    with pytest.raises(ProductServiceUnavailable) as excinfo:
+        await provider.get_many(items("P005"))
+    assert excinfo.value.retry_after == 12.5
+
+
+async def test_sku_without_product_id_raises(provider):
+    with pytest.raises(ProductLookupError):
+        await provider.get_many(items("SKU-X"))
+    assert FakeHTTP.requests == []
+
+
+async def test_skus_sharing_a_product_id_are_fetched_once(provider):
+    products = await provider.get_many(items("P003", "X-3", "P003"))
+
+    assert products["P003"] is products["X-3"]
+    assert FakeHTTP.requests == ["/products/3"]
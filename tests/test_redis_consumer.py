@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+from redis.exceptions import ResponseError
+
+from app.services.redis_consumer import RedisOrderConsumer
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeRedis:
+    def __init__(self, payloads: list[bytes]) -> None:
+        self.payloads = payloads
+        self.calls: list[str] = []
+
+    async def blpop(self, name: str, timeout: int) -> tuple[bytes, bytes] | None:
+        self.calls.append("blpop")
+        if not self.payloads:
+            await asyncio.sleep(0.01)
+            return None
+        return name.encode(), self.payloads.pop(0)
+
+    async def lpop(self, name: str, count: int) -> list[bytes] | None:
+        self.calls.append("lpop")
+        batch, self.payloads = self.payloads[:count], self.payloads[count:]
+        return batch or None
+
+
+class LegacyRedis(FakeRedis):
+    """Server older than 6.2: LPOP does not accept a count."""
+
+    async def lpop(self, name: str, count: int) -> list[bytes] | None:
+        self.calls.append("lpop")
+        raise ResponseError("wrong number of arguments for 'lpop' command")
+
+
+class RecordingProcessor:
+    def __init__(self) -> None:
+        self.order_ids: list[int] = []
+
+    async def enqueue(self, order) -> None:
+        self.order_ids.append(order.id)
+
+
+class FailingProcessor(RecordingProcessor):
+    """Rejects every order in the first batch, as a failed dedup query would."""
+
+    def __init__(self, fail_ids: set[int]) -> None:
+        super().__init__()
+        self.fail_ids = fail_ids
+
+    async def enqueue(self, order) -> None:
+        if order.id in self.fail_ids:
+            raise RuntimeError("dedup query failed")
+        await super().enqueue(order)
+
+
+def payload(order_id: int) -> bytes:
+    return json.dumps(
+        {
+            "id": order_id,
+            "customer": "ACME Corp",
+            "submitted_at": "2025-01-01T10:30:00Z",
+            "items": [{"sku": "P001", "quantity": 1, "unit_price": 10}],
+        }
+    ).encode()
+
+
+async def test_orders_are_read_in_batches():
+    redis = FakeRedis([payload(1), b"not json", payload(2), payload(3)])
+    processor = RecordingProcessor()
+    consumer = RedisOrderConsumer(redis, "orders", batch_size=10)  # type: ignore[arg-type]
+
+    await consumer.start(processor)  # type: ignore[arg-type]
+    await asyncio.sleep(0.05)
+    await consumer.stop()
+
+    assert processor.order_ids == [1, 2, 3]
+    assert redis.calls[:2] == ["blpop", "lpop"]
+    assert "lpop" not in redis.calls[2:]
+
+
+async def test_failed_drain_keeps_the_popped_payload():
+    redis = LegacyRedis([payload(1), payload(2), payload(3)])
+    processor = RecordingProcessor()
+    consumer = RedisOrderConsumer(redis, "orders", batch_size=10)  # type: ignore[arg-type]
+
+    await consumer.start(processor)  # type: ignore[arg-type]
+    await asyncio.sleep(0.05)
+    await consumer.stop()
+
+    assert processor.order_ids == [1, 2, 3]
+    assert redis.payloads == []
+    assert redis.calls.count("lpop") == 1
+
+
+async def test_failed_enqueue_does_not_stop_the_consumer():
+    redis = FakeRedis([payload(1), payload(2), payload(3)])
+    processor = FailingProcessor({1, 2})
+    consumer = RedisOrderConsumer(redis, "orders", batch_size=2)  # type: ignore[arg-type]
+
+    await consumer.start(processor)  # type: ignore[arg-type]
+    await asyncio.sleep(0.05)
+    assert consumer._task is not None and not consumer._task.done()
+    await consumer.stop()
+
+    assert processor.order_ids == [3]
+    assert redis.payloads == []
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import numpy as np
+
+from seed_orders import BUILD_BATCH, MAX_ITEMS, SKU_POOL, build_orders, iter_orders
+
+
+def test_built_orders_are_well_formed() -> None:
+    count = 500
+    orders = build_orders(count, np.random.default_rng(7), "2025-01-01T10:30:00+00:00")
+
+    assert [order["id"] for order in orders] == list(range(1, count + 1))
+    for order in orders:
+        skus = [item["sku"] for item in order["items"]]
+        assert 1 <= len(skus) <= MAX_ITEMS
+        assert len(set(skus)) == len(skus)
+        assert set(skus) <= set(SKU_POOL)
+        for item in order["items"]:
+            assert isinstance(item["quantity"], int) and 1 <= item["quantity"] <= 5
+            assert 5 <= item["unit_price"] <= 150
+            assert round(item["unit_price"], 2) == item["unit_price"]
+        assert order["submitted_at"] == "2025-01-01T10:30:00+00:00"
+
+
+def test_streamed_orders_are_numbered_across_batches_and_seeded() -> None:
+    count = BUILD_BATCH * 2 + 3
+    first = list(iter_orders(count, np.random.default_rng(11), "now"))
+    second = list(iter_orders(count, np.random.default_rng(11), "now"))
+
+    assert [order["id"] for order in first] == list(range(1, count + 1))
+    assert first == second